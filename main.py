@@ -1,11 +1,47 @@
 import os
 import json
+import asyncio
+import hashlib
+import shutil
+import subprocess
 import tempfile
 import sys
 import urllib.request
 import urllib.parse
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Optional
 
 import modal
+import requests
+import zstandard
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from talknet.json_format import (
+    format_results_as_json, dumps_json, dumps_compact, loads_json, write_results_json, probe_fps
+)
+
+# Enable MPS fallback for Apple Silicon
+os.environ.setdefault('PYTORCH_ENABLE_MPS_FALLBACK', '1')
+
+# TalkNet code lives next to this file locally, or under /root/talknet on Modal
+LOCAL_TALKNET_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'talknet')
+CLOUD_TALKNET_DIR = "/root/talknet"
+TALKNET_DIR = LOCAL_TALKNET_DIR if os.path.exists(LOCAL_TALKNET_DIR) else CLOUD_TALKNET_DIR
+if TALKNET_DIR not in sys.path:
+    sys.path.insert(0, TALKNET_DIR)
+
+
+def _download_weights():
+    """Fetch the TalkNet and S3FD weights at image build time so cold starts skip the download"""
+    if CLOUD_TALKNET_DIR not in sys.path:
+        sys.path.insert(0, CLOUD_TALKNET_DIR)
+    # demoTalkNet and the S3FD package download any missing weights on import
+    import demoTalkNet  # noqa: F401
+
 
 # Modal configuration
 app = modal.App("talknet-asd")
@@ -13,176 +49,561 @@ app = modal.App("talknet-asd")
 image = (
     modal.Image.debian_slim(python_version="3.9")
     .pip_install_from_requirements("requirements.txt")
-    .apt_install(["ffmpeg", "libgl1-mesa-glx", "libglib2.0-0"])
+    .apt_install(["ffmpeg", "libgl1-mesa-glx", "libglib2.0-0", "wget"])
     .env({"PYTORCH_ENABLE_MPS_FALLBACK": "1"})
+    .add_local_dir(LOCAL_TALKNET_DIR, remote_path=CLOUD_TALKNET_DIR, copy=True)
+    .run_function(_download_weights)
 )
 
 model_volume = modal.Volume.from_name("talknet-models", create_if_missing=True)
 
+# GPU classes: short clips go to DEFAULT_GPU, clips of LONG_VIDEO_SECONDS or more to LONG_VIDEO_GPU
+DEFAULT_GPU = os.environ.get("TALKNET_GPU", "T4")
+LONG_VIDEO_GPU = os.environ.get("TALKNET_LONG_GPU", "A10G")
+LONG_VIDEO_SECONDS = 600
+# ffprobe settings for measuring clip length before routing
+PROBE_TIMEOUT = 60
+PROBE_MAX_WORKERS = 16
+
+# Download buffer bounds (bytes)
+DOWNLOAD_MIN_BUFFER = 8 * 1024
+DOWNLOAD_MAX_BUFFER = 1024 * 1024
+
+# HTTP retry/resume settings
+DOWNLOAD_TIMEOUT = 60
+DOWNLOAD_MAX_RESUMES = 5
+
+# Parallel ranged download settings
+DOWNLOAD_RANGE_SIZE = 16 * 1024 * 1024
+DOWNLOAD_MAX_WORKERS = 8
+
+# Concurrent multi-URL download settings (batch mode)
+DOWNLOAD_MAX_CONNECTIONS = 16
+DOWNLOAD_STREAM_CHUNK = 256 * 1024
+# URLs prefetched per window, bounding open files and disk use in long batches
+DOWNLOAD_PREFETCH_WINDOW = 16
+
+# zstd level for results returned from Modal
+RESULT_COMPRESSION_LEVEL = 3
+
+# Result and video caches (on the Modal Volume in the cloud, under ~/.cache locally)
+CLOUD_CACHE_DIR = "/models"
+LOCAL_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "talknet")
+CACHE_HASH_SAMPLE = 1024 * 1024
+# Bump when the result format changes so stale cached results are not served
+RESULTS_CACHE_VERSION = 2
+VIDEO_CACHE_MAX_BYTES = 20 * 1024 * 1024 * 1024
+
+
+def _make_http_session():
+    """Keep-alive session that retries transient gateway errors with backoff"""
+    session = requests.Session()
+    retry = Retry(total=5, backoff_factor=0.5, status_forcelist=[502, 503, 504], allowed_methods=["HEAD", "GET"])
+    adapter = HTTPAdapter(max_retries=retry, pool_maxsize=DOWNLOAD_MAX_WORKERS)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    # Byte offsets must match the file on disk for ranges and resumes
+    session.headers['Accept-Encoding'] = 'identity'
+    return session
+
+
+_session = _make_http_session()
+
+
+def _probe_range_support(url):
+    """Return (content_length, accepts_ranges) for an HTTP(S) URL, or (0, False)"""
+    if not _classify_input(url).is_http or not hasattr(os, 'pwrite'):
+        return 0, False
+    try:
+        response = _session.head(url, allow_redirects=True, timeout=DOWNLOAD_TIMEOUT)
+        response.raise_for_status()
+        content_length = int(response.headers.get('Content-Length') or 0)
+        accepts_ranges = response.headers.get('Accept-Ranges', '').lower() == 'bytes'
+        return content_length, accepts_ranges
+    except Exception:
+        return 0, False
+
+
+def _download_range(url, fd, start, end):
+    """Fetch bytes [start, end] of url and write them at the same offset in fd"""
+    headers = {'Range': f'bytes={start}-{end}'}
+    with _session.get(url, headers=headers, stream=True, timeout=DOWNLOAD_TIMEOUT) as response:
+        if response.status_code != 206:
+            raise RuntimeError(f"Server ignored range request (HTTP {response.status_code})")
+        offset = start
+        for chunk in response.iter_content(DOWNLOAD_MAX_BUFFER):
+            os.pwrite(fd, chunk, offset)
+            offset += len(chunk)
+    if offset != end + 1:
+        raise RuntimeError(f"Incomplete range {start}-{end}: got {offset - start} bytes")
+
+
+def _download_parallel(url, out, content_length):
+    """Download url with concurrent HTTP range requests into the open binary file out"""
+    ranges = [
+        (start, min(start + DOWNLOAD_RANGE_SIZE, content_length) - 1)
+        for start in range(0, content_length, DOWNLOAD_RANGE_SIZE)
+    ]
+    os.ftruncate(out.fileno(), content_length)
+    with ThreadPoolExecutor(max_workers=min(DOWNLOAD_MAX_WORKERS, len(ranges))) as executor:
+        futures = [executor.submit(_download_range, url, out.fileno(), start, end) for start, end in ranges]
+        try:
+            for future in futures:
+                future.result()
+        except Exception:
+            # Don't fetch the remaining ranges; the caller restarts with a single stream
+            executor.shutdown(wait=True, cancel_futures=True)
+            raise
+
+
+def _buffer_size(content_length):
+    """Scale the read size with the file so large videos need fewer syscalls"""
+    return max(DOWNLOAD_MIN_BUFFER, min(DOWNLOAD_MAX_BUFFER, content_length // 256))
+
+
+def _download_single(url, out):
+    """Download url over a single connection into the open binary file out, resuming on drops"""
+    out.seek(0)
+    out.truncate()
+    if not _classify_input(url).is_http:
+        with urllib.request.urlopen(url) as response:
+            content_length = int(response.headers.get('Content-Length') or 0)
+            shutil.copyfileobj(response, out, length=_buffer_size(content_length))
+        return
+    
+    written = 0
+    resumes = 0
+    while True:
+        headers = {'Range': f'bytes={written}-'} if written else {}
+        try:
+            with _session.get(url, headers=headers, stream=True, timeout=DOWNLOAD_TIMEOUT) as response:
+                response.raise_for_status()
+                if written and response.status_code != 206:
+                    # Server ignored the range, so start over
+                    out.seek(0)
+                    out.truncate()
+                    written = 0
+                content_length = int(response.headers.get('Content-Length') or 0)
+                for chunk in response.iter_content(_buffer_size(content_length)):
+                    out.write(chunk)
+                    written += len(chunk)
+            return
+        except (requests.exceptions.ChunkedEncodingError,
+                requests.exceptions.ConnectionError,
+                requests.exceptions.Timeout) as e:
+            resumes += 1
+            if resumes > DOWNLOAD_MAX_RESUMES:
+                raise
+            out.flush()
+            print(f"Download interrupted after {written} bytes ({e}), resuming")
+
+
+def _remove_file(path):
+    """Delete path if it is still there"""
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
 
 def download_video_from_url(url, output_path=None):
     """Download video from URL to local file"""
     if output_path is None:
-        # Create temporary file
-        temp_file = tempfile.NamedTemporaryFile(suffix='.mp4', delete=False)
-        output_path = temp_file.name
-        temp_file.close()
+        # Create temporary file, keeping its descriptor open for writing
+        fd, output_path = tempfile.mkstemp(suffix='.mp4')
+    else:
+        fd = os.open(output_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
     
     print(f"Downloading video from: {url}")
     try:
-        urllib.request.urlretrieve(url, output_path)
+        with os.fdopen(fd, 'wb') as out:
+            content_length, accepts_ranges = _probe_range_support(url)
+            if accepts_ranges and content_length > DOWNLOAD_RANGE_SIZE:
+                try:
+                    _download_parallel(url, out, content_length)
+                except Exception as e:
+                    print(f"Parallel download failed ({e}), retrying with a single connection")
+                    _download_single(url, out)
+            else:
+                _download_single(url, out)
         print(f"Video downloaded to: {output_path}")
         return output_path
     except Exception as e:
-        if os.path.exists(output_path):
-            os.unlink(output_path)
+        _remove_file(output_path)
         raise Exception(f"Failed to download video: {e}")
 
 
-def is_url(path):
-    """Check if path is a URL"""
-    return path.startswith(('http://', 'https://', 'ftp://'))
+async def _download_many(urls, paths):
+    """Download each url to the matching path over one pooled aiohttp session
 
-
-def get_video_path_or_download(video_input):
-    """Get local video path, downloading from URL if needed"""
-    if is_url(video_input):
-        return download_video_from_url(video_input), True  # True = needs cleanup
-    else:
-        if not os.path.exists(video_input):
-            raise FileNotFoundError(f"Video file not found: {video_input}")
-        return video_input, False  # False = no cleanup needed
-
-
-def format_results_as_json(results, video_path, start_time, end_time):
-    """Format TalkNet results as JSON"""
-    json_output = {
-        "video_info": {
-            "path": video_path,
-            "start_time": start_time,
-            "end_time": end_time,
-            "total_frames": len(results)
-        },
-        "frames": []
-    }
+    Returns one entry per url: None on success, or the exception that download raised.
+    """
+    import aiohttp
     
-    for frame_data in results:
-        frame_info = {
-            "frame_number": frame_data["frame_number"],
-            "timestamp": frame_data["frame_number"] / 25.0,
-            "faces": []
-        }
+    async def fetch(session, url, path):
+        async with session.get(url) as response:
+            response.raise_for_status()
+            # Open only once a connection slot is ours, so idle downloads hold no descriptor
+            with open(path, 'wb') as out:
+                async for chunk in response.content.iter_chunked(DOWNLOAD_STREAM_CHUNK):
+                    out.write(chunk)
+        print(f"Video downloaded to: {path}")
+    
+    connector = aiohttp.TCPConnector(limit=DOWNLOAD_MAX_CONNECTIONS)
+    # No overall cap: large videos may take longer than aiohttp's 5 minute default
+    timeout = aiohttp.ClientTimeout(total=None, sock_connect=DOWNLOAD_TIMEOUT, sock_read=DOWNLOAD_TIMEOUT)
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        return await asyncio.gather(
+            *(fetch(session, url, path) for url, path in zip(urls, paths)), return_exceptions=True
+        )
+
+
+def download_videos_from_urls(urls):
+    """Download several videos concurrently, returning {url: local temp path}"""
+    paths = []
+    print(f"Downloading {len(urls)} videos concurrently")
+    try:
+        for _ in urls:
+            # Reserve the name now; fetch reopens it when its download starts
+            fd, path = tempfile.mkstemp(suffix='.mp4')
+            paths.append(path)
+            os.close(fd)
         
-        for face in frame_data["faces"]:
-            face_info = {
-                "track_id": face["track_id"],
-                "bounding_box": {
-                    "x1": face["x1"],
-                    "y1": face["y1"], 
-                    "x2": face["x2"],
-                    "y2": face["y2"],
-                    "width": face["x2"] - face["x1"],
-                    "height": face["y2"] - face["y1"]
-                },
-                "speaking": {
-                    "is_speaking": face["speaking"],
-                    "confidence_score": face["raw_score"],
-                    "threshold": 0.0
-                }
-            }
-            frame_info["faces"].append(face_info)
+        outcomes = asyncio.run(_download_many(urls, paths))
         
-        json_output["frames"].append(frame_info)
+        # Retry failures one by one with the resumable single-URL downloader
+        for url, path, outcome in zip(urls, paths, outcomes):
+            if outcome is not None:
+                print(f"Concurrent download of {url} failed ({outcome!r}), retrying on its own")
+                download_video_from_url(url, path)
+    except Exception as e:
+        for path in paths:
+            _remove_file(path)
+        raise Exception(f"Failed to download videos: {e!r}")
+    return dict(zip(urls, paths))
+
+
+REMOTE_SCHEMES = ('http', 'https', 'ftp')
+
+
+@dataclass(frozen=True)
+class VideoInput:
+    """A video path or URL, classified once so callers can branch on is_remote"""
+    source: str
+    scheme: str = ''
+    
+    @property
+    def is_remote(self):
+        return self.scheme in REMOTE_SCHEMES
+    
+    @property
+    def is_http(self):
+        return self.scheme in ('http', 'https')
+    
+    @property
+    def url(self) -> Optional[str]:
+        return self.source if self.is_remote else None
+    
+    @property
+    def local_path(self) -> Optional[str]:
+        return None if self.is_remote else self.source
+
+
+def _classify_input(video_input):
+    """Parse a path or URL into a VideoInput (VideoInputs pass through unchanged)"""
+    if isinstance(video_input, VideoInput):
+        return video_input
+    return VideoInput(video_input, urllib.parse.urlparse(video_input).scheme.lower())
+
+
+def get_video_path_or_download(video_input, validated=False):
+    """Get local video path, downloading from URL if needed
+
+    Pass validated=True when the caller has already checked that a local path exists.
+    """
+    inp = _classify_input(video_input)
+    if inp.is_remote:
+        return download_video_from_url(inp.url), True  # True = needs cleanup
+    else:
+        if not validated and not os.path.exists(inp.local_path):
+            raise FileNotFoundError(f"Video file not found: {inp.local_path}")
+        return inp.local_path, False  # False = no cleanup needed
+
+
+def _hash_video_input(video_input):
+    """Identify a video: the URL itself, or a sample of a local file's bytes plus its size"""
+    inp = _classify_input(video_input)
+    digest = hashlib.sha256()
+    if inp.is_remote:
+        digest.update(inp.url.encode('utf-8'))
+        return digest.hexdigest()
+    
+    size = os.path.getsize(inp.local_path)
+    digest.update(str(size).encode('utf-8'))
+    with open(inp.local_path, 'rb') as f:
+        digest.update(f.read(CACHE_HASH_SAMPLE))
+        if size > CACHE_HASH_SAMPLE:
+            f.seek(max(size - CACHE_HASH_SAMPLE, CACHE_HASH_SAMPLE))
+            digest.update(f.read(CACHE_HASH_SAMPLE))
+    return digest.hexdigest()
+
+
+def result_cache_key(video_input, start_time, end_time):
+    """Cache key for the TalkNet result of one clip"""
+    key = f"{_hash_video_input(video_input)}:{start_time}:{end_time}:{RESULTS_CACHE_VERSION}"
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+
+def _write_json_atomic(path, data):
+    """Write JSON next to path and rename it into place so readers never see partial files"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Containers share PIDs, so only a random suffix is unique on the shared volume
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+def load_cached_result(cache_dir, key, video_path):
+    """Return the cached result for key, or None on a miss
+
+    Local files are keyed by content, so the same clip may be cached under another
+    name; video_info.path is set to video_path, the input that was asked for.
+    """
+    try:
+        with open(os.path.join(cache_dir, "results_cache", f"{key}.json")) as f:
+            result = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+    result["video_info"]["path"] = video_path
+    return result
+
+
+def save_cached_result(cache_dir, key, result):
+    """Store a result under key"""
+    _write_json_atomic(os.path.join(cache_dir, "results_cache", f"{key}.json"), result)
+
+
+def _load_video_cache_index(video_cache_dir):
+    try:
+        with open(os.path.join(video_cache_dir, "index.json")) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def _evict_video_cache(video_cache_dir, index, keep):
+    """Drop the least frequently used videos (except keep) until the cache fits VIDEO_CACHE_MAX_BYTES"""
+    sizes = {}
+    for name in list(index):
+        try:
+            sizes[name] = os.path.getsize(os.path.join(video_cache_dir, name))
+        except FileNotFoundError:
+            del index[name]
+    
+    total = sum(sizes.values())
+    for name in sorted(sizes, key=lambda n: index[n]):
+        if total <= VIDEO_CACHE_MAX_BYTES:
+            break
+        if name == keep:
+            continue
+        _remove_file(os.path.join(video_cache_dir, name))
+        total -= sizes[name]
+        del index[name]
+
+
+def get_cached_video(cache_dir, url):
+    """Return a local copy of url from the video cache, downloading it on a miss"""
+    video_cache_dir = os.path.join(cache_dir, "video_cache")
+    name = f"{_hash_video_input(url)}.mp4"
+    video_path = os.path.join(video_cache_dir, name)
+    index = _load_video_cache_index(video_cache_dir)
     
-    return json_output
+    if not os.path.exists(video_path):
+        os.makedirs(video_cache_dir, exist_ok=True)
+        tmp_path = download_video_from_url(url, f"{video_path}.{uuid.uuid4().hex}.tmp")
+        os.replace(tmp_path, video_path)
+        index[name] = 0
+    else:
+        print(f"Using cached video for: {url}")
+    
+    # Hit counts drive LFU eviction
+    index[name] = index.get(name, 0) + 1
+    _evict_video_cache(video_cache_dir, index, keep=name)
+    _write_json_atomic(os.path.join(video_cache_dir, "index.json"), index)
+    return video_path
+
 
+@contextmanager
+def stream_video(video_input, cache_dir=None, validated=False):
+    """Yield a local video path for the TalkNet pipeline, removing any download on exit
+
+    TalkNet probes, seeks and decodes the input several times (ffprobe, scene
+    detection, frame extraction), so it needs a seekable file rather than a pipe.
+    Remote inputs are therefore fetched once and handed over as a temp file,
+    or kept in the video cache under cache_dir when one is given.
+    """
+    inp = _classify_input(video_input)
+    if cache_dir is not None and inp.is_remote:
+        yield get_cached_video(cache_dir, inp.url)
+        return
+    
+    video_path, needs_cleanup = get_video_path_or_download(inp, validated)
+    try:
+        yield video_path
+    finally:
+        # Clean up temporary file if it was downloaded
+        if needs_cleanup:
+            _remove_file(video_path)
 
-@app.function(
+
+def compress_result(result):
+    """Serialize a formatted result to zstd-compressed JSON bytes for the trip back from Modal"""
+    return zstandard.ZstdCompressor(level=RESULT_COMPRESSION_LEVEL).compress(dumps_compact(result))
+
+
+def decompress_result(blob):
+    """Inverse of compress_result"""
+    return loads_json(zstandard.ZstdDecompressor().decompress(blob))
+
+
+@app.cls(
     image=image,
     volumes={"/models": model_volume},
-    gpu="any",
+    gpu=DEFAULT_GPU,
     timeout=3600,
     memory=8192,
 )
-def process_video_url(video_url: str, start_time: float = 0, end_time: float = None):
-    """Process video on Modal cloud from URL"""
-    import sys
-    import os
-    
-    # Set up environment
-    os.environ['PYTORCH_ENABLE_MPS_FALLBACK'] = '1'
-    
-    # Download video from URL
-    temp_video_path, needs_cleanup = get_video_path_or_download(video_url)
-    
-    try:
-        # Check if talknet directory exists locally (mounted) or needs to be set up
-        local_talknet = os.path.join(os.path.dirname(__file__), 'talknet')
-        cloud_talknet = "/root/talknet"
-        
-        if os.path.exists(local_talknet):
-            print(f"Processing video with local talknet: {video_url}")
-            talknet_dir = local_talknet
-        elif os.path.exists(cloud_talknet):
-            print(f"Processing video on Modal cloud: {video_url}")
-            talknet_dir = cloud_talknet
-        else:
-            raise RuntimeError("TalkNet code not found. Ensure talknet directory is available.")
-        
-        # Add talknet to path
-        if talknet_dir not in sys.path:
-            sys.path.insert(0, talknet_dir)
-        
+class TalkNetService:
+    """TalkNet on Modal cloud, keeping the loaded model warm across calls"""
+
+    @modal.enter()
+    def load(self):
+        """Load TalkNet and the face detector once per container"""
         from demoTalkNet import setup, main
         
         # Initialize model
-        s, DET = setup()
+        self.s, self.DET = setup()
+        self.main = main
+
+    @modal.method()
+    def process(self, video_url: str, start_time: float = 0, end_time: float = None, use_cache: bool = True):
+        """Process video on Modal cloud from URL, returning the result as compress_result bytes"""
+        inp = _classify_input(video_url)
+        cache_dir = CLOUD_CACHE_DIR if use_cache else None
+        if use_cache:
+            key = result_cache_key(inp, start_time, end_time)
+            # Warm containers only see other containers' cache writes after a reload
+            model_volume.reload()
+            cached = load_cached_result(cache_dir, key, inp.source)
+            if cached is not None:
+                print(f"Using cached result for: {video_url}")
+                return compress_result(cached)
         
-        # Process video
-        results = main(
-            s=s,
-            DET=DET,
-            video_path=temp_video_path,
-            start_seconds=start_time,
-            end_seconds=end_time,
-            return_visualization=False,
-            face_boxes="",
-            in_memory_threshold=0
-        )
+        # Download video from URL
+        with stream_video(inp, cache_dir=cache_dir) as temp_video_path:
+            print(f"Processing video on Modal cloud: {video_url}")
+            
+            # Process video
+            results = self.main(
+                s=self.s,
+                DET=self.DET,
+                video_path=temp_video_path,
+                start_seconds=start_time,
+                end_seconds=end_time,
+                return_visualization=False,
+                face_boxes="",
+                in_memory_threshold=0
+            )
+            
+            # Format as JSON
+            output = format_results_as_json(
+                results, inp.source, start_time, end_time, fps=probe_fps(temp_video_path)
+            )
         
-        # Format as JSON
-        return format_results_as_json(results, video_url, start_time, end_time)
-    
-    finally:
-        # Clean up temporary file if it was downloaded
-        if needs_cleanup and os.path.exists(temp_video_path):
-            os.unlink(temp_video_path)
+        if use_cache:
+            save_cached_result(cache_dir, key, output)
+            # Persist cache writes for other containers
+            model_volume.commit()
+        return compress_result(output)
+
+
+
+def probe_duration(video_input):
+    """Duration in seconds of a local file or URL via ffprobe, or None if it cannot be probed"""
+    command = ["ffprobe", "-v", "error", "-show_entries", "format=duration",
+               "-of", "default=noprint_wrappers=1:nokey=1", video_input]
+    try:
+        return float(subprocess.check_output(command, timeout=PROBE_TIMEOUT))
+    except (OSError, subprocess.SubprocessError, ValueError):
+        return None
+
 
+def choose_gpu(video_input, start_time=0, end_time=None):
+    """Pick the GPU class for a clip from its length, defaulting to DEFAULT_GPU when unknown"""
+    if end_time is None:
+        end_time = probe_duration(video_input)
+        if end_time is None:
+            return DEFAULT_GPU
+    return LONG_VIDEO_GPU if end_time - start_time >= LONG_VIDEO_SECONDS else DEFAULT_GPU
 
 
-def run_local(video_input, start_time=0, end_time=None):
+def run_modal_batch(video_inputs, start_time=0, end_time=None, use_cache=True, gpu=None):
+    """Run TalkNet on Modal, sending each video to a GPU class sized for its length
+
+    Must be called inside app.run(). Pass gpu to force one class for every video.
+    """
+    sources = [_classify_input(v).source for v in video_inputs]
+    if gpu:
+        gpus = [gpu] * len(sources)
+    else:
+        # Length probes may hit the network, so run them side by side
+        with ThreadPoolExecutor(max_workers=max(1, min(PROBE_MAX_WORKERS, len(sources)))) as executor:
+            gpus = list(executor.map(lambda source: choose_gpu(source, start_time, end_time), sources))
+    by_gpu = {}
+    for i, gpu_class in enumerate(gpus):
+        by_gpu.setdefault(gpu_class, []).append(i)
+    
+    results = [None] * len(video_inputs)
+    for gpu_class, indices in by_gpu.items():
+        print(f"Dispatching {len(indices)} video(s) to {gpu_class}")
+        service_cls = TalkNetService if gpu_class == DEFAULT_GPU else TalkNetService.with_options(gpu=gpu_class)
+        n = len(indices)
+        outputs = service_cls().process.map(
+            [sources[i] for i in indices], [start_time] * n, [end_time] * n, [use_cache] * n
+        )
+        for i, blob in zip(indices, outputs):
+            results[i] = decompress_result(blob)
+    return results
+
+
+def run_local(video_input, start_time=0, end_time=None, use_cache=True, validated=False):
     """Run TalkNet locally without Modal - supports URLs and local files"""
-    import sys
-    import os
+    return run_local_batch([video_input], start_time, end_time, use_cache, validated)[0]
+
+
+def run_local_batch(video_inputs, start_time=0, end_time=None, use_cache=True, validated=False):
+    """Run TalkNet locally on several videos, loading the model only once"""
+    video_inputs = [_classify_input(v) for v in video_inputs]
     
-    # Add talknet directory to path
-    talknet_dir = os.path.join(os.path.dirname(__file__), 'talknet')
-    if talknet_dir not in sys.path:
-        sys.path.insert(0, talknet_dir)
+    # Serve cache hits before paying for model initialization
+    keys = [result_cache_key(v, start_time, end_time) if use_cache else None for v in video_inputs]
+    all_results = [
+        load_cached_result(LOCAL_CACHE_DIR, k, v.source) if use_cache else None
+        for k, v in zip(keys, video_inputs)
+    ]
+    if all(r is not None for r in all_results):
+        print("Using cached results")
+        return all_results
     
-    # Enable MPS fallback for Apple Silicon
-    os.environ['PYTORCH_ENABLE_MPS_FALLBACK'] = '1'
+    from demoTalkNet import setup, main
     
-    # Get video path (download if URL)
-    video_path, needs_cleanup = get_video_path_or_download(video_input)
+    # Initialize model
+    s, DET = setup()
     
-    try:
-        from demoTalkNet import setup, main
-        
-        print(f"Processing video locally: {video_input}")
-        
-        # Initialize model
-        s, DET = setup()
+    def process(i, video_path):
+        video_input = video_inputs[i]
+        print(f"Processing video locally: {video_input.source}")
         
         # Process video
         results = main(
@@ -197,12 +618,52 @@ def run_local(video_input, start_time=0, end_time=None):
         )
         
         # Format as JSON
-        return format_results_as_json(results, video_input, start_time, end_time)
+        all_results[i] = format_results_as_json(
+            results, video_input.source, start_time, end_time, fps=probe_fps(video_path)
+        )
+        if use_cache:
+            save_cached_result(LOCAL_CACHE_DIR, keys[i], all_results[i])
     
-    finally:
-        # Clean up downloaded file if needed
-        if needs_cleanup and os.path.exists(video_path):
-            os.unlink(video_path)
+    for i, video_input in enumerate(video_inputs):
+        if all_results[i] is not None:
+            print(f"Using cached result for: {video_input.source}")
+    
+    pending = [i for i, r in enumerate(all_results) if r is None]
+    for window_start in range(0, len(pending), DOWNLOAD_PREFETCH_WINDOW):
+        window = pending[window_start:window_start + DOWNLOAD_PREFETCH_WINDOW]
+        
+        # Fetch this window's remote inputs concurrently before its GPU loop
+        remote = [video_inputs[i].url for i in window if video_inputs[i].is_http]
+        uses_left = {url: remote.count(url) for url in remote}
+        downloaded = download_videos_from_urls(list(uses_left)) if len(uses_left) > 1 else {}
+        
+        try:
+            for i in window:
+                video_input = video_inputs[i]
+                prefetched = downloaded.get(video_input.url)
+                if prefetched is None:
+                    # Get video path (download if URL)
+                    with stream_video(video_input, validated=validated) as video_path:
+                        process(i, video_path)
+                    continue
+                
+                process(i, prefetched)
+                # Free disk as soon as the last use of this download is done
+                uses_left[video_input.url] -= 1
+                if uses_left[video_input.url] == 0:
+                    _remove_file(downloaded.pop(video_input.url))
+        finally:
+            # Clean up prefetched downloads left over after an error
+            for path in downloaded.values():
+                _remove_file(path)
+    
+    return all_results
+
+
+def read_batch_file(batch_path):
+    """Read one video path or URL per line, skipping blank lines and # comments"""
+    with open(batch_path) as f:
+        return [line.strip() for line in f if line.strip() and not line.strip().startswith('#')]
 
 
 if __name__ == "__main__":
@@ -224,42 +685,66 @@ Examples:
   # Process on Modal cloud - from URL
   python main.py https://example.com/video.mp4 --output results.json
   
+  # Process many videos (one path or URL per line) in a single run
+  python main.py --batch videos.txt --output results.json
+  
   # Alternative: Use Modal CLI directly
-  modal run main.py::process_video_url --video-url https://example.com/video.mp4 --start-time 0 --end-time 30
+  modal run main.py::TalkNetService.process --video-url https://example.com/video.mp4 --start-time 0 --end-time 30
         """
     )
-    parser.add_argument("video_input", help="Path to video file or URL (http/https)")
+    parser.add_argument("video_input", nargs="?", help="Path to video file or URL (http/https)")
     parser.add_argument("--start", type=float, default=0, help="Start time in seconds")
     parser.add_argument("--end", type=float, default=None, help="End time in seconds")
     parser.add_argument("--output", help="Output JSON file path")
     parser.add_argument("--local", action="store_true", help="Run locally instead of on Modal cloud")
+    parser.add_argument("--batch", help="Text file with one video path or URL per line; outputs a JSON list")
+    parser.add_argument("--no-cache", action="store_true", help="Ignore and do not update cached results")
+    parser.add_argument(
+        "--gpu",
+        help="Modal GPU class for every video (default: picked by video length, which needs a local "
+             "ffprobe when --end is not given; without it every video uses TALKNET_GPU)"
+    )
     
     args = parser.parse_args()
     
+    if args.batch:
+        video_inputs = [_classify_input(v) for v in read_batch_file(args.batch)]
+    elif args.video_input:
+        video_inputs = [_classify_input(args.video_input)]
+    else:
+        parser.error("either video_input or --batch is required")
+    
     # Validate video input (file or URL)
-    if not is_url(args.video_input) and not os.path.exists(args.video_input):
-        print(f"Error: Video file not found: {args.video_input}")
-        exit(1)
+    for video_input in video_inputs:
+        if not video_input.is_remote and not os.path.exists(video_input.local_path):
+            print(f"Error: Video file not found: {video_input.source}")
+            exit(1)
     
     try:
         if args.local:
             # Run locally
-            results = run_local(args.video_input, args.start, args.end)
+            results = run_local_batch(
+                video_inputs, args.start, args.end, use_cache=not args.no_cache, validated=True
+            )
         else:
             # Run on Modal cloud
             print("Processing on Modal cloud...")
-            print(f"Processing video: {args.video_input}")
+            print(f"Processing {len(video_inputs)} video(s): {', '.join(v.source for v in video_inputs)}")
             
             with app.run():
-                results = process_video_url.remote(args.video_input, args.start, args.end)
+                results = run_modal_batch(
+                    video_inputs, args.start, args.end, use_cache=not args.no_cache, gpu=args.gpu
+                )
+        
+        if not args.batch:
+            results = results[0]
         
         # Save or print results
         if args.output:
-            with open(args.output, 'w') as f:
-                json.dump(results, f, indent=2)
+            write_results_json(results, args.output)
             print(f"Results saved to: {args.output}")
         else:
-            print(json.dumps(results, indent=2))
+            print(dumps_json(results))
             
     except Exception as e:
         print(f"Error processing video: {e}")
@@ -0,0 +1,130 @@
+"""
+JSON formatting of TalkNet results, shared by main.py and run_talknet.py
+"""
+
+import json
+import math
+import subprocess
+
+import numpy as np
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Frame rate used for timestamps when the caller does not know the source rate
+FPS = 25.0
+
+
+def probe_fps(video_path):
+    """Frame rate of the first video stream via ffprobe, or FPS if it cannot be read
+
+    Uses r_frame_rate, the same rate demoTalkNet numbers its output frames by.
+    """
+    command = ["ffprobe", "-v", "error", "-select_streams", "v:0", "-show_entries", "stream=r_frame_rate",
+               "-of", "default=noprint_wrappers=1:nokey=1", video_path]
+    try:
+        fps_output = subprocess.check_output(command).decode('utf-8').strip()
+        num, _, den = fps_output.partition('/')
+        fps = float(num) / float(den) if den else float(num)
+    except (OSError, subprocess.SubprocessError, ValueError, ZeroDivisionError):
+        return FPS
+    if fps <= 0 or math.isnan(fps):
+        return FPS
+    return fps
+
+
+def format_results_as_json(results, video_path, start_time, end_time, fps=FPS):
+    """Format TalkNet results as JSON, timestamping frame numbers at fps"""
+    # Flatten faces into columns so derived fields are computed in one vector op
+    faces = [face for frame_data in results for face in frame_data["faces"]]
+    counts = np.fromiter((len(frame_data["faces"]) for frame_data in results), dtype=np.int64, count=len(results))
+    offsets = np.concatenate(([0], np.cumsum(counts))).tolist()
+    
+    track_id = [face["track_id"] for face in faces]
+    x1 = np.array([face["x1"] for face in faces], dtype=np.int64)
+    y1 = np.array([face["y1"] for face in faces], dtype=np.int64)
+    x2 = np.array([face["x2"] for face in faces], dtype=np.int64)
+    y2 = np.array([face["y2"] for face in faces], dtype=np.int64)
+    speaking = [face["speaking"] for face in faces]
+    score = [face["raw_score"] for face in faces]
+    width = (x2 - x1).tolist()
+    height = (y2 - y1).tolist()
+    x1, y1, x2, y2 = x1.tolist(), y1.tolist(), x2.tolist(), y2.tolist()
+    
+    frame_numbers = [frame_data["frame_number"] for frame_data in results]
+    timestamps = (np.asarray(frame_numbers, dtype=np.float64) / fps).tolist()
+    
+    # One pass over the zipped columns builds every face; frames then take slices
+    face_rows = [
+        {
+            "track_id": t,
+            "bounding_box": {"x1": a, "y1": b, "x2": c, "y2": d, "width": w, "height": h},
+            "speaking": {"is_speaking": sp, "confidence_score": sc, "threshold": 0.0}
+        }
+        for t, a, b, c, d, w, h, sp, sc in zip(track_id, x1, y1, x2, y2, width, height, speaking, score)
+    ]
+    frames = [
+        {"frame_number": n, "timestamp": ts, "faces": face_rows[start:end]}
+        for n, ts, start, end in zip(frame_numbers, timestamps, offsets, offsets[1:])
+    ]
+    
+    return {
+        "video_info": {
+            "path": video_path,
+            "start_time": start_time,
+            "end_time": end_time,
+            "total_frames": len(results)
+        },
+        "frames": frames
+    }
+
+
+def dumps_json(obj):
+    """Serialize obj as indented JSON text, using orjson when it is installed"""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2).decode('utf-8')
+    return json.dumps(obj, indent=2)
+
+
+def dumps_compact(obj):
+    """Serialize obj as compact JSON bytes"""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj).encode('utf-8')
+
+
+def loads_json(data):
+    """Parse JSON text or bytes, using orjson when it is installed"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def _write_result(f, result):
+    """Write one formatted result with one frame per line, never building the whole document"""
+    f.write(b'{')
+    for key, value in result.items():
+        if key != "frames":
+            f.write(dumps_compact(key) + b': ' + dumps_compact(value) + b', ')
+    f.write(b'"frames": [')
+    for i, frame in enumerate(result.get("frames", [])):
+        f.write(b'\n  ' if i == 0 else b',\n  ')
+        f.write(dumps_compact(frame))
+    f.write(b'\n]}')
+
+
+def write_results_json(results, output_path):
+    """Stream a formatted result (or a list of them) to output_path as JSON"""
+    with open(output_path, 'wb') as f:
+        if isinstance(results, list):
+            f.write(b'[\n')
+            for i, result in enumerate(results):
+                if i:
+                    f.write(b',\n')
+                _write_result(f, result)
+            f.write(b'\n]\n')
+        else:
+            _write_result(f, results)
+            f.write(b'\n')
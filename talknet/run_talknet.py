@@ -6,12 +6,12 @@ Usage: python run_talknet.py path/to/video.mp4
 
 import sys
 import os
-import json
 
 # Enable MPS fallback for unsupported operations on Apple Silicon
 os.environ['PYTORCH_ENABLE_MPS_FALLBACK'] = '1'
 
 from demoTalkNet import setup, main
+from json_format import format_results_as_json, dumps_json, write_results_json, probe_fps
 
 def run_talknet(video_path, start_time=0, end_time=None, return_viz=False, output_json=False):
     """
@@ -50,54 +50,10 @@ def run_talknet(video_path, start_time=0, end_time=None, return_viz=False, outpu
     )
     
     if output_json:
-        return format_results_as_json(results, video_path, start_time, end_time)
+        return format_results_as_json(results, video_path, start_time, end_time, fps=probe_fps(video_path))
     
     return results
 
-def format_results_as_json(results, video_path, start_time, end_time):
-    """
-    Format TalkNet results as JSON with proper structure
-    """
-    json_output = {
-        "video_info": {
-            "path": video_path,
-            "start_time": start_time,
-            "end_time": end_time,
-            "total_frames": len(results)
-        },
-        "frames": []
-    }
-    
-    for frame_data in results:
-        frame_info = {
-            "frame_number": frame_data["frame_number"],
-            "timestamp": frame_data["frame_number"] / 25.0,  # Assuming 25 FPS processing
-            "faces": []
-        }
-        
-        for face in frame_data["faces"]:
-            face_info = {
-                "track_id": face["track_id"],
-                "bounding_box": {
-                    "x1": face["x1"],
-                    "y1": face["y1"], 
-                    "x2": face["x2"],
-                    "y2": face["y2"],
-                    "width": face["x2"] - face["x1"],
-                    "height": face["y2"] - face["y1"]
-                },
-                "speaking": {
-                    "is_speaking": face["speaking"],
-                    "confidence_score": face["raw_score"],
-                    "threshold": 0.0
-                }
-            }
-            frame_info["faces"].append(face_info)
-        
-        json_output["frames"].append(frame_info)
-    
-    return json_output
-
 if __name__ == "__main__":
     if len(sys.argv) < 2:
         print("Usage: python run_talknet.py <video_path> [start_time] [end_time] [return_viz] [--json] [--output file.json]")
@@ -138,12 +94,11 @@ if __name__ == "__main__":
         if output_json:
             if output_file:
                 # Save to file
-                with open(output_file, 'w') as f:
-                    json.dump(results, f, indent=2)
+                write_results_json(results, output_file)
                 print(f"JSON results saved to: {output_file}")
             else:
                 # Print to stdout
-                print(json.dumps(results, indent=2))
+                print(dumps_json(results))
         else:
             print(f"\nProcessing complete!")
             print(f"Found {len(results)} frames with face detections")